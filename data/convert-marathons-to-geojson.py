@@ -4,141 +4,208 @@ Convert marathons CSV data to GeoJSON format for use with the map component.
 """
 
 import csv
+import gzip
+import io
 import json
+import os
+import re
+import shutil
 import sys
 from datetime import datetime
 
-def clean_coordinate(coord_str):
-    """Clean and convert coordinate string to float."""
-    if not coord_str or coord_str.strip() == '':
-        return None
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pac
+except ImportError:
+    pac = None
+
+def _dumps(obj):
+    """Serialize obj as indented UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+def write_geojson(path, features):
+    """Stream features to disk as a GeoJSON FeatureCollection (plus a gzip copy) and return how many were written."""
+    count = 0
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(b'{\n  "type": "FeatureCollection",\n  "features": [')
+            for feature in features:
+                f.write(b',\n    ' if count else b'\n    ')
+                f.write(_dumps(feature).replace(b'\n', b'\n    '))
+                count += 1
+            f.write(b'\n  ]' if count else b']')
+            f.write(b'\n}')
+        os.replace(tmp_path, path)
+        
+        # mtime=0 keeps the archive byte-identical when the data has not changed
+        with open(path, 'rb') as src, open(tmp_path, 'wb') as f:
+            with gzip.GzipFile(path + '.gz', 'wb', compresslevel=6, fileobj=f, mtime=0) as dst:
+                shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, path + '.gz')
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return count
+
+def read_csv(f):
+    """Read a binary CSV stream into a DataFrame of strings, using PyArrow's parser when installed.
     
-    # Replace unicode minus signs with regular minus
-    coord_str = coord_str.replace('−', '-')
+    As with csv.DictReader, short rows are padded with '' and extra fields are dropped.
+    """
+    # Take column names from the header so every column is read as a plain string
+    header = next(csv.reader([f.readline().decode('utf-8-sig')]), [])
+    data = f.read()
+    if not data.strip():
+        return pd.DataFrame(columns=header, dtype=str)
     
-    try:
-        return float(coord_str.strip())
-    except ValueError:
-        return None
+    if pac is not None:
+        try:
+            table = pac.read_csv(
+                io.BytesIO(data),
+                read_options=pac.ReadOptions(column_names=header),
+                parse_options=pac.ParseOptions(newlines_in_values=True),
+                convert_options=pac.ConvertOptions(column_types={name: pa.string() for name in header})
+            )
+            return table.to_pandas().fillna('')
+        except pa.ArrowInvalid as e:
+            # PyArrow rejects rows with a different number of fields than the header
+            print(f"PyArrow could not parse the CSV ({e}), falling back to pandas")
+    
+    return pd.read_csv(io.BytesIO(data), names=header, header=None, usecols=range(len(header)),
+                       dtype=str, encoding='utf-8', keep_default_na=False)
+
+def clean_coordinates(coords):
+    """Clean and convert a column of coordinate strings to floats (NaN if invalid)."""
+    # Replace unicode minus signs with regular minus
+    coords = coords.str.replace('−', '-', regex=False).str.strip()
+    return pd.to_numeric(coords, errors='coerce').astype(float)
+
+# Common encoding issues, applied in a single pass (longest match first)
+_REPL = {
+    'Ã©': 'é',    # Fix é character
+    'Ã¨': 'è',    # Fix è character
+    'Ã¡': 'á',    # Fix á character
+    'Ã­': 'í',    # Fix í character
+    'Ã³': 'ó',    # Fix ó character
+    'Ã¼': 'ü',    # Fix ü character
+    'Ã±': 'ñ',    # Fix ñ character
+    'Ã§': 'ç',    # Fix ç character
+    'â€™': "'",   # Fix apostrophe
+    'â€œ': '"',   # Fix left quote
+    'â€': '"',    # Fix right quote
+    'â€"': '–',   # Fix en/em dash
+}
+_REPL_RE = re.compile('|'.join(re.escape(k) for k in sorted(_REPL, key=len, reverse=True)))
+
+_DMY = re.compile(r'^\s*(?P<d>\d{1,2})/(?P<m>\d{1,2})/(?P<y>\d{4})\s*$')
 
 def clean_text(text):
     """Clean text by removing extra whitespace and handling encoding."""
     if not text:
         return ""
     
-    # Handle common encoding issues
-    text = text.replace('Ã©', 'é')  # Fix é character
-    text = text.replace('Ã¨', 'è')  # Fix è character  
-    text = text.replace('Ã¡', 'á')  # Fix á character
-    text = text.replace('Ã­', 'í')  # Fix í character
-    text = text.replace('Ã³', 'ó')  # Fix ó character
-    text = text.replace('Ã¼', 'ü')  # Fix ü character
-    text = text.replace('Ã±', 'ñ')  # Fix ñ character
-    text = text.replace('Ã§', 'ç')  # Fix ç character
-    text = text.replace('â€™', "'")  # Fix apostrophe
-    text = text.replace('â€œ', '"')  # Fix left quote
-    text = text.replace('â€', '"')   # Fix right quote
-    text = text.replace('â€"', '–')  # Fix en dash
-    text = text.replace('â€"', '—')  # Fix em dash
-    
-    return text.strip()
+    return _REPL_RE.sub(lambda m: _REPL[m.group(0)], text).strip()
+
+def clean_text_column(values):
+    """Apply clean_text once per distinct value of a column."""
+    cleaned = {value: clean_text(value) for value in values.unique()}
+    return values.map(cleaned)
 
 def parse_date(date_str):
     """Parse date string to ISO format."""
     if not date_str or date_str.strip() == '':
         return None
     
-    date_str = date_str.strip()
-    
-    # Handle various date formats
-    try:
-        # Try DD/MM/YYYY format first
-        if '/' in date_str:
-            parts = date_str.split('/')
-            if len(parts) == 3:
-                day, month, year = parts
-                return f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-        
-        # Try other formats as needed
-        return date_str
-    except:
-        return date_str
+    # Try DD/MM/YYYY format first, otherwise pass the value through
+    m = _DMY.match(date_str)
+    if m:
+        return f"{m['y']}-{m['m']:0>2}-{m['d']:0>2}"
+    return date_str.strip()
+
+def iter_features(df):
+    """Yield a GeoJSON feature for each (already filtered) marathon row."""
+    # Unpack the needed columns once instead of building a dict per row
+    columns = ['lon', 'lat', 'Name', 'City', 'ISO3', 'Year', 'Full / Half', 'Date', 'Sign up deadlines',
+               'Availability', 'Landing Page', 'Google Ads', 'Comments', 'Map Info Text']
+    # Optional columns missing from the sheet read as empty strings
+    rows = zip(*(df[col].tolist() if col in df.columns else [''] * len(df) for col in columns))
+    for (lon, lat, name, city, iso3, year, marathon_type, date, signup_deadline,
+         availability, landing_page, google_ads, comments, map_info_text) in rows:
+        yield {
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": [lon, lat]
+            },
+            "properties": {
+                "type": "marathon",
+                "name": name,
+                "city": city,
+                "country_iso": iso3,
+                "year": year,
+                "marathon_type": marathon_type,
+                "date": parse_date(date),
+                "signup_deadline": parse_date(signup_deadline),
+                "availability": availability,
+                "landing_page": clean_text(landing_page),
+                "google_ads": clean_text(google_ads),
+                "comments": clean_text(comments),
+                "map_info_text": clean_text(map_info_text)
+            }
+        }
 
 def convert_csv_to_geojson(csv_file_path, geojson_file_path):
     """Convert CSV file to GeoJSON format."""
     
-    features = []
-    skipped_count = 0
-    processed_count = 0
+    with open(csv_file_path, 'rb') as csvfile:
+        df = read_csv(csvfile)
     
-    with open(csv_file_path, 'r', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        
-        for row_num, row in enumerate(reader, start=2):  # Start at 2 since header is row 1
-            # Skip if show? is not TRUE
-            show_value = row.get('show?', '').strip().upper()
-            if show_value != 'TRUE':
-                skipped_count += 1
-                continue
-            
-            # Get coordinates
-            lat_str = row.get('lat', '').strip()
-            lon_str = row.get('lon', '').strip()
-            
-            lat = clean_coordinate(lat_str)
-            lon = clean_coordinate(lon_str)
-            
-            # Skip if coordinates are invalid
-            if lat is None or lon is None:
-                skipped_count += 1
-                print(f"Row {row_num}: Skipping due to invalid coordinates: lat='{lat_str}', lon='{lon_str}'")
-                continue
-            
-            # Skip if essential fields are missing
-            name = clean_text(row.get('Name', ''))
-            city = clean_text(row.get('City', ''))
-            
-            if not name or name == '#REF!' or not city or city == '#REF!':
-                skipped_count += 1
-                print(f"Row {row_num}: Skipping due to missing/invalid name or city")
-                continue
-            
-            # Create feature
-            feature = {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [lon, lat]
-                },
-                "properties": {
-                    "type": "marathon",
-                    "name": name,
-                    "city": city,
-                    "country_iso": clean_text(row.get('ISO3', '')),
-                    "year": clean_text(row.get('Year', '')),
-                    "marathon_type": clean_text(row.get('Full / Half', '')),
-                    "date": parse_date(row.get('Date', '')),
-                    "signup_deadline": parse_date(row.get('Sign up deadlines', '')),
-                    "availability": clean_text(row.get('Availability', '')),
-                    "landing_page": clean_text(row.get('Landing Page', '')),
-                    "google_ads": clean_text(row.get('Google Ads', '')),
-                    "comments": clean_text(row.get('Comments', '')),
-                    "map_info_text": clean_text(row.get('Map Info Text', ''))
-                }
-            }
-            
-            features.append(feature)
-            processed_count += 1
-    
-    # Create GeoJSON structure
-    geojson = {
-        "type": "FeatureCollection",
-        "features": features
-    }
-    
-    # Write to file
-    with open(geojson_file_path, 'w', encoding='utf-8') as geojsonfile:
-        json.dump(geojson, geojsonfile, indent=2, ensure_ascii=False)
+    # Required columns missing from the sheet read as empty strings, so every row is skipped
+    for col in ['show?', 'lat', 'lon', 'Name', 'City']:
+        if col not in df.columns:
+            df[col] = ''
+    
+    # Get coordinates and essential fields
+    lat = clean_coordinates(df['lat'])
+    lon = clean_coordinates(df['lon'])
+    df['Name'] = df['Name'].map(clean_text)
+    df['City'] = df['City'].map(clean_text)
+    
+    # Keep rows with show? TRUE, valid coordinates and a name and city
+    show = df['show?'].str.strip().str.upper().eq('TRUE')
+    valid_coords = lat.notna() & lon.notna()
+    valid_fields = ~df['Name'].isin(['', '#REF!']) & ~df['City'].isin(['', '#REF!'])
+    keep = show & valid_coords & valid_fields
+    
+    # Report skipped rows in sheet order, checking coordinates before name and city
+    skipped = df.loc[show & ~keep]
+    reasons = pd.Series('Skipping due to missing/invalid name or city', index=skipped.index)
+    bad_coords = ~valid_coords[skipped.index]
+    reasons[bad_coords] = ("Skipping due to invalid coordinates: lat='" + skipped.loc[bad_coords, 'lat'].str.strip()
+                           + "', lon='" + skipped.loc[bad_coords, 'lon'].str.strip() + "'")
+    for row_num, reason in zip(skipped.index + 2, reasons):
+        print(f"Row {row_num}: {reason}")
+    
+    skipped_count = int((~keep).sum())
+    df = df.loc[keep].assign(lat=lat[keep], lon=lon[keep])
+    
+    # Columns with heavily repeated values are cleaned per distinct value
+    for col in ['ISO3', 'Year', 'Full / Half', 'Availability']:
+        if col in df.columns:
+            df[col] = clean_text_column(df[col])
+    
+    # Write features to file as they are built
+    processed_count = write_geojson(geojson_file_path, iter_features(df))
     
     print(f"Conversion complete!")
     print(f"Processed: {processed_count} records")
@@ -13,7 +13,7 @@ fi
 
 # Install required Python packages
 echo "📦 Installing required packages..."
-pip3 install requests
+pip3 install requests pandas pyarrow orjson
 
 # Run the marathon data update script
 echo "🔄 Updating marathon data..."
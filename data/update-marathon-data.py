@@ -5,71 +5,201 @@ This script automatically downloads the latest data and updates the public GeoJS
 """
 
 import csv
+import gzip
+import io
 import json
 import os
+import re
+import shutil
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import sys
 from datetime import datetime
 
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pac
+except ImportError:
+    pac = None
+
+# Shared HTTP session: keep-alive between requests and retries on Google Sheets 5xx errors
+_SESSION = requests.Session()
+_SESSION.headers['Accept-Encoding'] = 'gzip, deflate'
+_SESSION.mount('https://', HTTPAdapter(max_retries=Retry(total=5, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])))
+
 # Google Sheets CSV URL
 GOOGLE_SHEET_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vSDhMx8shcqFiqMKjLnrC0NNhV3b_kNCyn7FfpT0IYd8gPJf0VnKtgkGSmtJRWzbTaLR1LtSeMnmwny/pub?gid=730702317&single=true&output=csv"
 
-def clean_coordinate(coord_str):
-    """Clean and convert coordinate string to float."""
-    if not coord_str or coord_str.strip() == '':
-        return None
+def _dumps(obj):
+    """Serialize obj as indented UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+def write_geojson(path, features, metadata=None):
+    """Stream features to disk as a GeoJSON FeatureCollection (plus a gzip copy) and return how many were written."""
+    count = 0
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(b'{\n  "type": "FeatureCollection",\n  "features": [')
+            for feature in features:
+                f.write(b',\n    ' if count else b'\n    ')
+                f.write(_dumps(feature).replace(b'\n', b'\n    '))
+                count += 1
+            f.write(b'\n  ]' if count else b']')
+            # Metadata goes after the features so total_features is known
+            if metadata is not None:
+                metadata = dict(metadata, total_features=count)
+                f.write(b',\n  "metadata": ' + _dumps(metadata).replace(b'\n', b'\n  '))
+            f.write(b'\n}')
+        os.replace(tmp_path, path)
+        
+        # mtime=0 keeps the archive byte-identical when the data has not changed
+        with open(path, 'rb') as src, open(tmp_path, 'wb') as f:
+            with gzip.GzipFile(path + '.gz', 'wb', compresslevel=6, fileobj=f, mtime=0) as dst:
+                shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, path + '.gz')
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return count
+
+def read_csv(f):
+    """Read a binary CSV stream into a DataFrame of strings, using PyArrow's parser when installed.
     
-    # Replace unicode minus signs with regular minus
-    coord_str = coord_str.replace('−', '-')
+    As with csv.DictReader, short rows are padded with '' and extra fields are dropped.
+    """
+    # Take column names from the header so every column is read as a plain string
+    header = next(csv.reader([f.readline().decode('utf-8-sig')]), [])
+    data = f.read()
+    if not data.strip():
+        return pd.DataFrame(columns=header, dtype=str)
     
-    try:
-        return float(coord_str.strip())
-    except ValueError:
-        return None
+    if pac is not None:
+        try:
+            table = pac.read_csv(
+                io.BytesIO(data),
+                read_options=pac.ReadOptions(column_names=header),
+                parse_options=pac.ParseOptions(newlines_in_values=True),
+                convert_options=pac.ConvertOptions(column_types={name: pa.string() for name in header})
+            )
+            return table.to_pandas().fillna('')
+        except pa.ArrowInvalid as e:
+            # PyArrow rejects rows with a different number of fields than the header
+            print(f"PyArrow could not parse the CSV ({e}), falling back to pandas")
+    
+    return pd.read_csv(io.BytesIO(data), names=header, header=None, usecols=range(len(header)),
+                       dtype=str, encoding='utf-8', keep_default_na=False)
+
+def clean_coordinates(coords):
+    """Clean and convert a column of coordinate strings to floats (NaN if invalid)."""
+    # Replace unicode minus signs with regular minus
+    coords = coords.str.replace('−', '-', regex=False).str.strip()
+    return pd.to_numeric(coords, errors='coerce').astype(float)
+
+# Common encoding issues, applied in a single pass (longest match first)
+_REPL = {
+    'â': '-',     # Fix specific "â" character to hyphen
+    'Ã©': 'é',    # Fix é character
+    'Ã¨': 'è',    # Fix è character
+    'Ã¡': 'á',    # Fix á character
+    'Ã­': 'í',    # Fix í character
+    'Ã³': 'ó',    # Fix ó character
+    'Ã¼': 'ü',    # Fix ü character
+    'Ã±': 'ñ',    # Fix ñ character
+    'Ã§': 'ç',    # Fix ç character
+    'â€™': "'",   # Fix apostrophe
+    'â€œ': '"',   # Fix left quote
+    'â€': '"',    # Fix right quote
+    'â€"': '–',   # Fix en/em dash
+}
+_REPL_RE = re.compile('|'.join(re.escape(k) for k in sorted(_REPL, key=len, reverse=True)))
+
+_DMY = re.compile(r'^\s*(?P<d>\d{1,2})/(?P<m>\d{1,2})/(?P<y>\d{4})\s*$')
 
 def clean_text(text):
     """Clean text by removing extra whitespace and handling encoding."""
     if not text:
         return ""
     
-    # Handle common encoding issues
-    text = text.replace('â', '-')   # Fix specific "â" character to hyphen
-    text = text.replace('Ã©', 'é')  # Fix é character
-    text = text.replace('Ã¨', 'è')  # Fix è character  
-    text = text.replace('Ã¡', 'á')  # Fix á character
-    text = text.replace('Ã­', 'í')  # Fix í character
-    text = text.replace('Ã³', 'ó')  # Fix ó character
-    text = text.replace('Ã¼', 'ü')  # Fix ü character
-    text = text.replace('Ã±', 'ñ')  # Fix ñ character
-    text = text.replace('Ã§', 'ç')  # Fix ç character
-    text = text.replace('â€™', "'")  # Fix apostrophe
-    text = text.replace('â€œ', '"')  # Fix left quote
-    text = text.replace('â€', '"')   # Fix right quote
-    text = text.replace('â€"', '–')  # Fix en dash
-    text = text.replace('â€"', '—')  # Fix em dash
-    
-    return text.strip()
+    return _REPL_RE.sub(lambda m: _REPL[m.group(0)], text).strip()
+
+def clean_text_column(values):
+    """Apply clean_text once per distinct value of a column."""
+    cleaned = {value: clean_text(value) for value in values.unique()}
+    return values.map(cleaned)
 
 def parse_date(date_str):
     """Parse date string to ISO format."""
     if not date_str or date_str.strip() == '':
         return None
     
-    date_str = date_str.strip()
-    
-    # Handle various date formats
+    # Try DD/MM/YYYY format first, otherwise pass the value through
+    m = _DMY.match(date_str)
+    if m:
+        return f"{m['y']}-{m['m']:0>2}-{m['d']:0>2}"
+    return date_str.strip()
+
+def iter_features(df):
+    """Yield a GeoJSON feature for each (already filtered) marathon row."""
+    # Unpack the needed columns once instead of building a dict per row
+    columns = ['lon', 'lat', 'Name', 'City', 'ISO3', 'Year', 'Full / Half', 'Date', 'Sign up deadlines',
+               'Availability', 'Landing Page', 'Google Ads', 'Comments', 'Map Info Text']
+    # Optional columns missing from the sheet read as empty strings
+    rows = zip(*(df[col].tolist() if col in df.columns else [''] * len(df) for col in columns))
+    for (lon, lat, name, city, iso3, year, marathon_type, date, signup_deadline,
+         availability, landing_page, google_ads, comments, map_info_text) in rows:
+        yield {
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": [lon, lat]
+            },
+            "properties": {
+                "type": "marathon",
+                "name": name,
+                "city": city,
+                "country_iso": iso3,
+                "year": year,
+                "marathon_type": marathon_type,
+                "date": parse_date(date),
+                "signup_deadline": parse_date(signup_deadline),
+                "availability": availability,
+                "landing_page": clean_text(landing_page),
+                "google_ads": clean_text(google_ads),
+                "comments": clean_text(comments),
+                "map_info_text": clean_text(map_info_text)
+            }
+        }
+
+def load_validators(meta_path):
+    """Build conditional request headers from the ETag / Last-Modified of the last download."""
     try:
-        # Try DD/MM/YYYY format first
-        if '/' in date_str:
-            parts = date_str.split('/')
-            if len(parts) == 3:
-                day, month, year = parts
-                return f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-        
-        # Try other formats as needed
-        return date_str
-    except:
-        return date_str
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    
+    headers = {}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    return headers
+
+def save_validators(meta_path, etag, last_modified):
+    """Remember the ETag / Last-Modified of a download for the next conditional request."""
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({'etag': etag, 'last_modified': last_modified}, f, indent=2)
 
 def download_and_convert():
     """Download CSV from Google Sheets and convert to GeoJSON."""
@@ -78,88 +208,60 @@ def download_and_convert():
     print(f"📥 Downloading from: {GOOGLE_SHEET_URL}")
     print("Downloading marathon data from Google Sheets...")
     
+    output_file = "data/marathons.geojson"
+    meta_path = output_file + '.meta.json'
+    
     try:
-        # Download CSV data
-        response = requests.get(GOOGLE_SHEET_URL)
-        response.raise_for_status()
+        # Only ask for the sheet if it changed since the output was last written
+        headers = load_validators(meta_path) if os.path.exists(output_file) else {}
         
-        # Parse CSV
-        csv_content = response.text
-        csv_reader = csv.DictReader(csv_content.splitlines())
+        # Download and parse CSV data as it streams in
+        with _SESSION.get(GOOGLE_SHEET_URL, headers=headers, stream=True, timeout=30) as response:
+            if response.status_code == 304:
+                print(f"✅ Marathon data unchanged since last download, keeping {output_file}")
+                return True
+            
+            response.raise_for_status()
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            response.raw.decode_content = True
+            df = read_csv(response.raw)
         
-        features = []
-        skipped_count = 0
-        processed_count = 0
+        # Required columns missing from the sheet read as empty strings, so every row is skipped
+        for col in ['show?', 'lat', 'lon', 'Name', 'City']:
+            if col not in df.columns:
+                df[col] = ''
         
-        for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 since header is row 1
-            # Skip if show? is not TRUE
-            show_value = row.get('show?', '').strip().upper()
-            if show_value != 'TRUE':
-                skipped_count += 1
-                continue
-            
-            # Get coordinates
-            lat_str = row.get('lat', '').strip()
-            lon_str = row.get('lon', '').strip()
-            
-            lat = clean_coordinate(lat_str)
-            lon = clean_coordinate(lon_str)
-            
-            # Skip if coordinates are invalid
-            if lat is None or lon is None:
-                skipped_count += 1
-                print(f"Row {row_num}: Skipping due to invalid coordinates: lat='{lat_str}', lon='{lon_str}'")
-                continue
-            
-            # Skip if essential fields are missing
-            name = clean_text(row.get('Name', ''))
-            city = clean_text(row.get('City', ''))
-            
-            if not name or name == '#REF!' or not city or city == '#REF!':
-                skipped_count += 1
-                print(f"Row {row_num}: Skipping due to missing/invalid name or city")
-                continue
-            
-            # Create feature
-            feature = {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [lon, lat]
-                },
-                "properties": {
-                    "type": "marathon",
-                    "name": name,
-                    "city": city,
-                    "country_iso": clean_text(row.get('ISO3', '')),
-                    "year": clean_text(row.get('Year', '')),
-                    "marathon_type": clean_text(row.get('Full / Half', '')),
-                    "date": parse_date(row.get('Date', '')),
-                    "signup_deadline": parse_date(row.get('Sign up deadlines', '')),
-                    "availability": clean_text(row.get('Availability', '')),
-                    "landing_page": clean_text(row.get('Landing Page', '')),
-                    "google_ads": clean_text(row.get('Google Ads', '')),
-                    "comments": clean_text(row.get('Comments', '')),
-                    "map_info_text": clean_text(row.get('Map Info Text', ''))
-                }
-            }
-            
-            features.append(feature)
-            processed_count += 1
+        # Get coordinates and essential fields
+        lat = clean_coordinates(df['lat'])
+        lon = clean_coordinates(df['lon'])
+        df['Name'] = df['Name'].map(clean_text)
+        df['City'] = df['City'].map(clean_text)
         
-        # Create GeoJSON structure
-        geojson = {
-            "type": "FeatureCollection",
-            "features": features,
-            "metadata": {
-                "last_updated": datetime.now().isoformat(),
-                "source": "Google Sheets",
-                "total_features": len(features)
-            }
-        }
+        # Keep rows with show? TRUE, valid coordinates and a name and city
+        show = df['show?'].str.strip().str.upper().eq('TRUE')
+        valid_coords = lat.notna() & lon.notna()
+        valid_fields = ~df['Name'].isin(['', '#REF!']) & ~df['City'].isin(['', '#REF!'])
+        keep = show & valid_coords & valid_fields
+        
+        # Report skipped rows in sheet order, checking coordinates before name and city
+        skipped = df.loc[show & ~keep]
+        reasons = pd.Series('Skipping due to missing/invalid name or city', index=skipped.index)
+        bad_coords = ~valid_coords[skipped.index]
+        reasons[bad_coords] = ("Skipping due to invalid coordinates: lat='" + skipped.loc[bad_coords, 'lat'].str.strip()
+                               + "', lon='" + skipped.loc[bad_coords, 'lon'].str.strip() + "'")
+        for row_num, reason in zip(skipped.index + 2, reasons):
+            print(f"Row {row_num}: {reason}")
+        
+        skipped_count = int((~keep).sum())
+        df = df.loc[keep].assign(lat=lat[keep], lon=lon[keep])
+        
+        # Columns with heavily repeated values are cleaned per distinct value
+        for col in ['ISO3', 'Year', 'Full / Half', 'Availability']:
+            if col in df.columns:
+                df[col] = clean_text_column(df[col])
         
         # Ensure output directory exists
-        output_file = "data/marathons.geojson"
         output_dir = os.path.dirname(output_file)
         if output_dir and not os.path.exists(output_dir):
             os.makedirs(output_dir)
@@ -167,8 +269,12 @@ def download_and_convert():
         
         # Write to file
         print(f"📝 Writing GeoJSON to: {os.path.abspath(output_file)}")
-        with open(output_file, 'w', encoding='utf-8') as geojsonfile:
-            json.dump(geojson, geojsonfile, indent=2, ensure_ascii=False)
+        metadata = {
+            "last_updated": datetime.now().isoformat(),
+            "source": "Google Sheets"
+        }
+        processed_count = write_geojson(output_file, iter_features(df), metadata)
+        save_validators(meta_path, etag, last_modified)
         
         # Verify file was created
         if os.path.exists(output_file):
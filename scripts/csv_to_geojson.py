@@ -1,12 +1,46 @@
 #!/usr/bin/env python3
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
+import gzip
+import io
 import json
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _make_session() -> requests.Session:
+    """Create an HTTP session that retries on Google Sheets 5xx errors.
+
+    Each fetch gets its own session because requests.Session is not guaranteed to be thread-safe.
+    """
+    session = requests.Session()
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    session.mount("https://", HTTPAdapter(max_retries=Retry(total=5, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])))
+    return session
+
+def write_geojson(path: str, geojson: Dict[str, Any]) -> None:
+    """Write GeoJSON to disk along with a gzip-compressed copy, using orjson when it is installed."""
+    if orjson is not None:
+        data = orjson.dumps(geojson, option=orjson.OPT_INDENT_2)
+    else:
+        data = json.dumps(geojson, indent=2, ensure_ascii=False).encode("utf-8")
+
+    with open(path, "wb") as f:
+        f.write(data)
+
+    # mtime=0 keeps the archive byte-identical when the data has not changed
+    with gzip.GzipFile(path + ".gz", "wb", compresslevel=6, mtime=0) as f:
+        f.write(data)
+
 def normalize_column_name(col: str) -> str:
     """Convert sheet headers into stable machine-friendly names."""
     col = str(col).strip().lower()
@@ -15,6 +49,11 @@ def normalize_column_name(col: str) -> str:
     col = re.sub(r"\s+", "_", col)      # spaces -> underscores
     return col
 
+def clean_numeric(values: pd.Series) -> pd.Series:
+    """Coerce a column to numbers, tolerating unicode minus signs and stray whitespace."""
+    values = values.astype(str).str.replace(r"\s+", "", regex=True).str.replace("−", "-", regex=False)
+    return pd.to_numeric(values, errors="coerce")
+
 def standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
     """Normalize columns and map important aliases to stable names."""
     df.columns = [normalize_column_name(col) for col in df.columns]
@@ -41,60 +80,55 @@ def standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
     df = df.rename(columns=rename_map)
     return df
 
-def fetch_csv_to_geojson(url: str, raw_csv_name: str) -> Dict[str, Any]:
+def fetch_csv_to_geojson(url: str, name: str) -> Dict[str, Any]:
     """Fetch CSV from URL and convert to GeoJSON."""
     try:
-        response = requests.get(url, timeout=30)
+        with _make_session() as session:
+            response = session.get(url, timeout=30)
         response.raise_for_status()
 
-        with open(raw_csv_name, "w", encoding="utf-8") as f:
-            f.write(response.text)
-
-        df = pd.read_csv(raw_csv_name)
+        df = pd.read_csv(io.StringIO(response.text))
 
-        print(f"Original columns: {df.columns.tolist()}")
-        print(f"Shape: {df.shape}")
-        print(f"First few rows:\n{df.head()}")
+        print(f"[{name}] Original columns: {df.columns.tolist()}")
+        print(f"[{name}] Shape: {df.shape}")
+        print(f"[{name}] First few rows:\n{df.head()}")
 
         df = standardize_columns(df)
 
-        print(f"Normalized columns: {df.columns.tolist()}")
+        print(f"[{name}] Normalized columns: {df.columns.tolist()}")
 
         # Check coordinates
         if "lat" not in df.columns or "lon" not in df.columns:
-            print(f"Could not find lat/lon columns in: {df.columns.tolist()}")
+            print(f"[{name}] Could not find lat/lon columns in: {df.columns.tolist()}")
             return {"type": "FeatureCollection", "features": []}
 
         # Filter by show
         if "show" in df.columns:
-            df["show"] = df["show"].astype(str).str.upper().str.strip()
-            df = df[df["show"] == "TRUE"]
+            df["show"] = df["show"].astype(str).str.strip().str.upper()
+            df = df[df["show"].eq("TRUE")]
 
         # Convert coordinates
-        df["lat"] = pd.to_numeric(df["lat"], errors="coerce")
-        df["lon"] = pd.to_numeric(df["lon"], errors="coerce")
+        df["lat"] = clean_numeric(df["lat"])
+        df["lon"] = clean_numeric(df["lon"])
 
         # Drop invalid rows
         df = df.dropna(subset=["lat", "lon"])
 
-        features = []
-        for _, row in df.iterrows():
-            properties = {}
-
-            for col in df.columns:
-                if col not in ["lat", "lon"]:
-                    value = row[col]
-                    properties[col] = "" if pd.isna(value) else str(value)
+        # Build properties and coordinates column-wise instead of per row
+        props_df = df.drop(columns=["lat", "lon"]).fillna("").astype(str)
+        coords = df[["lon", "lat"]].to_numpy(dtype=float).tolist()
 
-            feature = {
+        features = [
+            {
                 "type": "Feature",
                 "geometry": {
                     "type": "Point",
-                    "coordinates": [float(row["lon"]), float(row["lat"])]
+                    "coordinates": coordinates
                 },
                 "properties": properties
             }
-            features.append(feature)
+            for coordinates, properties in zip(coords, props_df.to_dict(orient="records"))
+        ]
 
         return {
             "type": "FeatureCollection",
@@ -102,31 +136,30 @@ def fetch_csv_to_geojson(url: str, raw_csv_name: str) -> Dict[str, Any]:
         }
 
     except Exception as e:
-        print(f"Error processing {raw_csv_name}: {e}")
+        print(f"Error processing {name}: {e}")
         return {"type": "FeatureCollection", "features": []}
 
 def fetch_and_convert_solar() -> Dict[str, Any]:
     url = "https://docs.google.com/spreadsheets/d/e/2PACX-1vTJsNnPxAHbTwpovOYffeCdbZoVHBJzJI6vIWqvsV6Zj6S9PK0wpkUyoo27bXW8QxOaalujL_6VlfFP/pub?gid=1234705142&single=true&output=csv"
-    return fetch_csv_to_geojson(url, "solar_data.csv")
+    return fetch_csv_to_geojson(url, "solar")
 
 def fetch_and_convert_medical() -> Dict[str, Any]:
     url = "https://docs.google.com/spreadsheets/d/e/2PACX-1vSwQfNVeLSL33IGytiDNV8DAduygRZ5xC0EBI1JLzrgjEFeKANCDTcQ9m9AcWgjtSOec5UcBUvOH_fW/pub?gid=1455555915&single=true&output=csv"
-    return fetch_csv_to_geojson(url, "medical_data.csv")
+    return fetch_csv_to_geojson(url, "medical")
 
 def main():
     os.makedirs("data", exist_ok=True)
 
-    print("Fetching solar data...")
-    solar_geojson = fetch_and_convert_solar()
-
-    print("Fetching medical data...")
-    medical_geojson = fetch_and_convert_medical()
-
-    with open("data/solar.geojson", "w", encoding="utf-8") as f:
-        json.dump(solar_geojson, f, indent=2, ensure_ascii=False)
+    # Both fetches are network-bound, so run them concurrently
+    print("Fetching solar and medical data...")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        solar_future = executor.submit(fetch_and_convert_solar)
+        medical_future = executor.submit(fetch_and_convert_medical)
+        solar_geojson = solar_future.result()
+        medical_geojson = medical_future.result()
 
-    with open("data/medical.geojson", "w", encoding="utf-8") as f:
-        json.dump(medical_geojson, f, indent=2, ensure_ascii=False)
+    write_geojson("data/solar.geojson", solar_geojson)
+    write_geojson("data/medical.geojson", medical_geojson)
 
     combined_features = solar_geojson["features"] + medical_geojson["features"]
     combined_geojson = {
@@ -134,8 +167,7 @@ def main():
         "features": combined_features
     }
 
-    with open("data/combined.geojson", "w", encoding="utf-8") as f:
-        json.dump(combined_geojson, f, indent=2, ensure_ascii=False)
+    write_geojson("data/combined.geojson", combined_geojson)
 
     print(f"Generated {len(solar_geojson['features'])} solar features")
     print(f"Generated {len(medical_geojson['features'])} medical features")
@@ -1,26 +1,82 @@
 #!/usr/bin/env python3
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import numpy as np
 import pandas as pd
+import gzip
+import io
 import json
 import os
 from typing import Dict, Any
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from numba import njit, types
+except ImportError:
+    njit = None
+
+# Shared HTTP session: keep-alive between requests and retries on Google Sheets 5xx errors
+_SESSION = requests.Session()
+_SESSION.headers['Accept-Encoding'] = 'gzip, deflate'
+_SESSION.mount('https://', HTTPAdapter(max_retries=Retry(total=5, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])))
+
+def write_geojson(path: str, geojson: Dict[str, Any]) -> None:
+    """Write GeoJSON to disk along with a gzip-compressed copy, using orjson when it is installed."""
+    if orjson is not None:
+        data = orjson.dumps(geojson, option=orjson.OPT_INDENT_2)
+    else:
+        data = json.dumps(geojson, indent=2, ensure_ascii=False).encode('utf-8')
+
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    # mtime=0 keeps the archive byte-identical when the data has not changed
+    with gzip.GzipFile(path + '.gz', 'wb', compresslevel=6, mtime=0) as f:
+        f.write(data)
+
+def clean_numeric(values: pd.Series) -> pd.Series:
+    """Coerce a column to numbers, tolerating unicode minus signs and stray whitespace."""
+    values = values.astype(str).str.replace(r'\s+', '', regex=True).str.replace('−', '-', regex=False)
+    return pd.to_numeric(values, errors='coerce')
+
+if njit is not None:
+    # Compiled eagerly for the one signature we use (read-only inputs also accept
+    # writable arrays) and cached on disk so repeat runs skip LLVM compilation
+    _coords = types.Array(types.float64, 1, 'A', readonly=True)
+
+    @njit(types.boolean[:](_coords, _coords), cache=True, boundscheck=False)
+    def valid_mask(lat, lon):
+        """Return True where lat/lon are present and within WGS84 bounds."""
+        n = lat.shape[0]
+        out = np.empty(n, np.bool_)
+        for i in range(n):
+            la = lat[i]
+            lo = lon[i]
+            # NaN compares unequal to itself, so missing coordinates fail here
+            out[i] = (la == la) and (lo == lo) and -90.0 <= la <= 90.0 and -180.0 <= lo <= 180.0
+        return out
+else:
+    def valid_mask(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """Return True where lat/lon are present and within WGS84 bounds."""
+        return (lat >= -90.0) & (lat <= 90.0) & (lon >= -180.0) & (lon <= 180.0)
+
 def fetch_and_convert_to_geojson() -> Dict[str, Any]:
     """Fetch marathon data from Google Sheets and convert to GeoJSON"""
     url = "https://docs.google.com/spreadsheets/d/e/2PACX-1vSDhMx8shcqFiqMKjLnrC0NNhV3b_kNCyn7FfpT0IYd8gPJf0VnKtgkGSmtJRWzbTaLR1LtSeMnmwny/pub?gid=730702317&single=true&output=csv"
     
     try:
         print("Fetching data from Google Sheets...")
-        response = requests.get(url)
+        response = _SESSION.get(url, timeout=30)
         response.raise_for_status()
         
-        # Save raw CSV for debugging
-        with open('temp_data.csv', 'w', encoding='utf-8') as f:
-            f.write(response.text)
-        
         # Read CSV with pandas
-        df = pd.read_csv('temp_data.csv')
+        df = pd.read_csv(io.StringIO(response.text))
         
         print(f"Data columns: {df.columns.tolist()}")
         print(f"Data shape: {df.shape}")
@@ -29,44 +85,35 @@ def fetch_and_convert_to_geojson() -> Dict[str, Any]:
         # Clean column names
         df.columns = df.columns.str.strip()
         
-        features = []
-        for idx, row in df.iterrows():
-            try:
-                # Get longitude and latitude
-                lon = pd.to_numeric(row['Longitude'], errors='coerce')
-                lat = pd.to_numeric(row['Latitude'], errors='coerce')
-                
-                # Skip rows without valid coordinates
-                if pd.isna(lat) or pd.isna(lon):
-                    print(f"Row {idx}: Skipping - missing coordinates")
-                    continue
-                
-                # Validate coordinates
-                if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
-                    print(f"Row {idx}: Invalid coordinates: lat={lat}, lon={lon}")
-                    continue
-                
-                # Create properties from all columns except Longitude/Latitude
-                properties = {}
-                for col in df.columns:
-                    if col not in ['Longitude', 'Latitude']:
-                        value = row[col]
-                        properties[col] = str(value) if pd.notna(value) else ""
-                
-                feature = {
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "Point",
-                        "coordinates": [lon, lat]
-                    },
-                    "properties": properties
-                }
-                
-                features.append(feature)
-                
-            except Exception as e:
-                print(f"Error processing row {idx}: {e}")
-                continue
+        # Parse coordinates for the whole sheet at once
+        lon = clean_numeric(df['Longitude'])
+        lat = clean_numeric(df['Latitude'])
+        
+        # Skip rows without valid coordinates
+        missing = lat.isna() | lon.isna()
+        for idx in df.index[missing]:
+            print(f"Row {idx}: Skipping - missing coordinates")
+        
+        # Validate coordinates
+        mask = pd.Series(valid_mask(lat.to_numpy(np.float64), lon.to_numpy(np.float64)), index=df.index)
+        for idx in df.index[~missing & ~mask]:
+            print(f"Row {idx}: Invalid coordinates: lat={lat[idx]}, lon={lon[idx]}")
+        
+        # Create properties from all columns except Longitude/Latitude
+        props_df = df.loc[mask].drop(columns=['Longitude', 'Latitude']).fillna("").astype(str)
+        coords = zip(lon[mask].tolist(), lat[mask].tolist())
+        
+        features = [
+            {
+                "type": "Feature",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [x, y]
+                },
+                "properties": properties
+            }
+            for (x, y), properties in zip(coords, props_df.to_dict(orient='records'))
+        ]
         
         geojson = {
             "type": "FeatureCollection",
@@ -79,10 +126,6 @@ def fetch_and_convert_to_geojson() -> Dict[str, Any]:
     except Exception as e:
         print(f"Error fetching or processing data: {e}")
         return {"type": "FeatureCollection", "features": []}
-    finally:
-        # Clean up temp file
-        if os.path.exists('temp_data.csv'):
-            os.remove('temp_data.csv')
 
 def main():
     # Fetch and convert data
@@ -92,8 +135,7 @@ def main():
     output_path = 'data/marathons.geojson'
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(geojson_data, f, indent=2, ensure_ascii=False)
+    write_geojson(output_path, geojson_data)
     
     print(f"\nGeoJSON saved to {output_path}")
     print(f"Total features: {len(geojson_data['features'])}")